@@ -1,61 +1,271 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, render_template, render_template_string, request, redirect, url_for, flash, session, jsonify, make_response, Response, stream_with_context, g, has_app_context
+from flask.json.provider import JSONProvider, _default as _flask_json_default
+from werkzeug.security import check_password_hash
+from werkzeug.exceptions import HTTPException
 from werkzeug.utils import secure_filename
 from supabase import create_client, Client
 import re
-import difflib
+import numpy as np
+from rapidfuzz import fuzz, process
 from datetime import datetime, timedelta, timezone
 import google.generativeai as genai
 import os
 import json
+import orjson
+import hashlib
+import hmac
+import uuid
+import atexit
+import functools
+import heapq
+import operator
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import threading
+import time
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+import redis
+from cachetools import LRUCache, TTLCache
+from celery import Celery
+from flask_session import Session
+from passlib.context import CryptContext
+from streaming_form_data import StreamingFormDataParser
+from streaming_form_data.targets import FileTarget
 from dotenv import load_dotenv
+import db
+
+# Logging: request threads only enqueue records; a background listener thread
+# does the actual (possibly slow) write to stderr
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(_log_queue, logging.StreamHandler())
+_log_listener.start()
+# Registered before any other exit handler, so it runs last (atexit is LIFO)
+# and records logged during shutdown still get written
+atexit.register(_log_listener.stop)
+logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(_log_queue)])
+logger = logging.getLogger(__name__)
 
 # Load environment variables
 load_dotenv()
 
+class OrjsonProvider(JSONProvider):
+    """jsonify()/request.get_json() backed by orjson
+
+    Types orjson doesn't know (Decimal marks from Postgres, etc.) go through
+    Flask's default converter, so responses look the same as before.
+    """
+    option = orjson.OPT_NON_STR_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_flask_json_default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        # orjson has no object_hook; callers that need one (the cookie
+        # session serializer untags tuples/markup that way) get stdlib json
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response (no str round trip)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_flask_json_default, option=self.option)
+        return self._app.response_class(body, mimetype="application/json")
+
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", 'your-super-secret-key-change-this-in-production')
+# "Remember me" sessions last 30 days; login only has to mark them permanent
+app.permanent_session_lifetime = timedelta(days=30)
 
 # Configure Gemini
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 model = genai.GenerativeModel('gemini-1.5-flash')
 
-# Configure Supabase
-try:
-    supabase_url = os.getenv("SUPABASE_URL")
-    supabase_key = os.getenv("SUPABASE_KEY")
-    
-    if not supabase_url or not supabase_key:
-        raise Exception("Missing SUPABASE_URL or SUPABASE_KEY in environment")
-    
-    supabase: Client = create_client(supabase_url, supabase_key)
-    print("✅ Connected to Supabase successfully!")
-    
-    # Test connection (optional - can be removed for production)
+# Generation settings are fixed, so build them once instead of per request
+CHAT_GENERATION_CONFIG = genai.types.GenerationConfig(
+    max_output_tokens=400,
+    temperature=0.7,
+)
+RECOMMENDATION_GENERATION_CONFIG = genai.types.GenerationConfig(
+    max_output_tokens=800,
+    temperature=0.7,
+)
+
+# Configure Supabase lazily - creating the client at import time cost every
+# cold start (serverless instances in particular) even for requests that never
+# touch the database
+@functools.lru_cache(maxsize=None)
+def get_supabase():
+    """Return the shared Supabase client, created on first use (None if unavailable)"""
+    try:
+        # SUPABASE_REST_URL lets the REST client and the pooled Postgres
+        # engine (SUPABASE_DB_URL) be configured separately
+        supabase_url = os.getenv("SUPABASE_REST_URL") or os.getenv("SUPABASE_URL")
+        supabase_key = os.getenv("SUPABASE_KEY")
+        
+        if not supabase_url or not supabase_key:
+            raise Exception("Missing SUPABASE_URL or SUPABASE_KEY in environment")
+        
+        # One client per process: its PostgREST httpx session (and the
+        # kept-alive TLS connection) is reused by every call. supabase-py
+        # already bounds each PostgREST call at 5s by default.
+        client: Client = create_client(supabase_url, supabase_key)
+        logger.info("✅ Connected to Supabase successfully!")
+        return client
+    except Exception as e:
+        logger.error("❌ Supabase connection error: %s", e)
+        return None
+
+# Optional startup check (STARTUP_DB_CHECK=1) - off by default so cold starts
+# don't pay for a round trip to the database
+if os.getenv("STARTUP_DB_CHECK") == "1" and get_supabase():
     try:
-        test_response = supabase.table('users').select('id').limit(1).execute()
-        print("✅ Database tables verified and accessible!")
+        get_supabase().table('users').select('id').limit(1).execute()
+        logger.info("✅ Database tables verified and accessible!")
     except:
-        print("⚠️ Database test query failed, but connection established")
+        logger.warning("⚠️ Database test query failed, but connection established")
+
+# Pooled direct Postgres access for the hot queries (None without SUPABASE_DB_URL)
+engine = db.init_engine(os.getenv("SUPABASE_DB_URL"))
+
+def db_connection():
+    """Pooled connection held for the rest of the request (None outside one)
     
+    Reusing it saves a pool checkout - and its pre-ping round trip - for
+    every further query in the same request; teardown returns it.
+    """
+    if not has_app_context():
+        return None
+    if 'db_conn' not in g:
+        g.db_conn = engine.connect()
+    return g.db_conn
+
+@app.teardown_appcontext
+def release_db_connection(exception=None):
+    """Return the request's pooled connection (if any) to the pool"""
+    conn = g.pop('db_conn', None)
+    if conn is not None:
+        conn.close()
+
+# Configure Redis (optional cache layer - app works without it)
+try:
+    redis_url = os.getenv("REDIS_URL")
+    redis_client = redis.Redis.from_url(redis_url) if redis_url else None
+    if redis_client:
+        redis_client.ping()
+        logger.info("✅ Connected to Redis cache!")
 except Exception as e:
-    print(f"❌ Supabase connection error: {e}")
-    supabase = None
+    logger.warning("⚠️ Redis unavailable, caching disabled: %s", e)
+    redis_client = None
+
+# Keep session data in Redis when available - the cookie then carries only a
+# session id; otherwise fall back to Flask's signed-cookie sessions
+if redis_client:
+    app.config.update(
+        SESSION_TYPE='redis',
+        SESSION_REDIS=redis_client,
+        SESSION_PERMANENT=False,
+        SESSION_USE_SIGNER=True,  # sign the session id cookie with secret_key
+    )
+    Session(app)
+
+# Configure Celery for background writes. Without CELERY_BROKER_URL (local dev,
+# Vercel) tasks run eagerly in-process, exactly like a plain function call.
+celery_broker_url = os.getenv("CELERY_BROKER_URL")
+celery = Celery(app.import_name, broker=celery_broker_url)
+celery.conf.task_always_eager = not celery_broker_url
+celery.conf.task_ignore_result = True
+
+# Fire-and-forget writes whose result no response needs. In eager mode
+# .delay() would run them inline, so they go to a small thread pool instead.
+# Vercel freezes the function as soon as the response is sent, so work left on
+# in-process threads may never run there - writes stay on the request path.
+BACKGROUND_THREADS = not os.environ.get('VERCEL')
+_background_executor = ThreadPoolExecutor(max_workers=4)
+
+def run_in_background(task, *args):
+    """Queue a Celery task, or run it on the background pool when there is no broker
+    
+    These writes are best-effort: a failure (broker down, pool shut down) is
+    logged and never fails the request that triggered it.
+    """
+    try:
+        if not celery.conf.task_always_eager:
+            task.delay(*args)
+        elif BACKGROUND_THREADS:
+            _background_executor.submit(task, *args)
+        else:
+            task(*args)
+    except Exception:
+        logger.exception("Background write %s failed", getattr(task, 'name', task))
+
+# Password hashing: argon2 for all new hashes. Accounts created earlier still
+# carry Werkzeug pbkdf2/scrypt hashes and are re-hashed on their next login.
+pwd_ctx = CryptContext(
+    schemes=["argon2"],
+    deprecated="auto",
+    argon2__rounds=2,
+    argon2__memory_cost=65536,
+    argon2__parallelism=2,
+)
+
+EMAIL_EXISTS_TTL = 300  # seconds
+EMAIL_LOCAL_CACHE_TTL = 30  # seconds, process-local tier in front of Redis
+USER_CACHE_TTL = 60  # seconds (process-local tier)
+USER_REDIS_CACHE_TTL = 600  # seconds (shared Redis tier)
+CHAT_LOG_BATCH_SIZE = 50  # max chat_logs rows per insert
+CHAT_LOG_FLUSH_INTERVAL = 2.0  # seconds a partial batch waits for more rows
+CHAT_LOG_QUEUE_MAX = 10000  # rows held in memory before new ones are dropped
+PG_UNIQUE_VIOLATION = '23505'  # Postgres error code, surfaced by PostgREST's APIError.code
 
-# Configure upload settings for Vercel (use /tmp for serverless)
-UPLOAD_FOLDER = '/tmp/uploads' if os.environ.get('VERCEL') else 'static/uploads'
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'}
+# Columns fetched per lookup - only what login and the profile/recommendation
+# pages actually read, instead of SELECT *
+AUTH_COLUMNS = "id, full_name, email, password_hash"
+USER_PROFILE_COLUMNS = (
+    "id, full_name, email, father_name, gender, phone, district, address, "
+    "qualification, qualification_marks, course, course_marks, area_of_interest, "
+    "skills, languages, experience, prior_internship, profile_completed"
+)
+# The recommendation views only need the scorer/prompt inputs
+USER_RECOMMENDATION_COLUMNS = (
+    "id, full_name, skills, area_of_interest, qualification, prior_internship, "
+    "profile_completed"
+)
+GEMINI_CACHE_TTL = 3600  # seconds
+GEMINI_LOCAL_CACHE_TTL = 1800  # seconds
+SSE_HEARTBEAT_INTERVAL = 15  # seconds between keep-alive comments on event streams
+RECOMMENDATION_CACHE_TTL = 3600  # seconds
+
+# Text fields accepted from the profile form, and the numeric marks fields
+# that are parsed with _f
+PROFILE_FORM_FIELDS = (
+    'full_name', 'father_name', 'gender', 'phone', 'district', 'address',
+    'qualification', 'course', 'area_of_interest', 'skills', 'languages',
+    'experience', 'prior_internship',
+)
+PROFILE_MARKS_FIELDS = frozenset({'qualification_marks', 'course_marks'})
+
+# Configure upload settings for Vercel (use /tmp for serverless). Uploads are
+# personal documents, so they live in the instance folder - never under
+# static/, which Flask serves to anyone who guesses the URL
+UPLOAD_FOLDER = '/tmp/uploads' if os.environ.get('VERCEL') else os.path.join(app.instance_path, 'uploads')
+ALLOWED_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx'})
+
+UPLOAD_CATEGORIES = ('certificates', 'additional')
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
 
-# Create upload directories
+# Create upload directories once at import; the upload route relies on them existing
 try:
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-    os.makedirs(os.path.join(UPLOAD_FOLDER, 'certificates'), exist_ok=True)
-    os.makedirs(os.path.join(UPLOAD_FOLDER, 'additional'), exist_ok=True)
+    for category in UPLOAD_CATEGORIES:
+        os.makedirs(os.path.join(UPLOAD_FOLDER, category), exist_ok=True)
 except Exception as e:
-    print(f"Upload folder creation warning: {e}")
+    logger.warning("Upload folder creation warning: %s", e)
 
 # PM Internship Scheme Knowledge Base
 INTERNSHIP_CONTEXT = """
@@ -95,30 +305,128 @@ CONTACT SUPPORT:
 Always be helpful, accurate, and professional. Keep responses concise but comprehensive. Use emojis appropriately.
 """
 
+# Static part of every chat prompt, joined once at import
+CHAT_PROMPT_PREFIX = INTERNSHIP_CONTEXT + "\n\n"
+
+# Gemini is asked to write this placeholder instead of the user's name, so one
+# cached answer can be shared by everyone asking the same question
+USER_NAME_TOKEN = "[USER_NAME]"
+
+# Everything in a chat prompt around the user's question, joined once at import
+CHAT_PROMPT_HEAD = (
+    f"{CHAT_PROMPT_PREFIX}"
+    f"Refer to the user as {USER_NAME_TOKEN} when addressing them personally.\n\n"
+    f"User question: "
+)
+CHAT_PROMPT_TAIL = "\n\nProvide a helpful response about the PM Internship Scheme:\n"
+
+# Hash state of the fixed prompt parts: cache keys extend a copy with the
+# question, so edits to the context or instructions still change every key
+_chat_prompt_hash = hashlib.sha1(f"{CHAT_PROMPT_HEAD}\0{CHAT_PROMPT_TAIL}".encode())
+
+# Questions whose answer depends on when they are asked are never cached
+TIME_SENSITIVE_QUESTION = re.compile(
+    r"\b(?:today|tonight|tomorrow|yesterday|now|this (?:week|month|year))\b"
+    r"|\b\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}\b"
+)
+
+# Process-local tier in front of the Redis answer cache: FAQ-style questions
+# repeat constantly, so a warm instance answers them without a round trip
+_gemini_answers = TTLCache(maxsize=2048, ttl=GEMINI_LOCAL_CACHE_TTL)
+_gemini_answers_lock = threading.Lock()
+
 def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    dot = filename.rfind('.')
+    return dot != -1 and filename[dot + 1:].lower() in ALLOWED_EXTENSIONS
 
-def check_email_exists(email):
-    """Check if email already exists using Supabase"""
+def cache_get(key):
+    """Read a value from Redis; returns None on a miss or if Redis is unavailable"""
+    if not redis_client:
+        return None
+    try:
+        return redis_client.get(key)
+    except Exception as e:
+        logger.warning("Redis cache read error: %s", e)
+        return None
+
+def cache_set(key, ttl, value):
+    """Store a value in Redis with a TTL; silently skipped if Redis is unavailable"""
+    if not redis_client:
+        return
     try:
+        redis_client.setex(key, ttl, value)
+    except Exception as e:
+        logger.warning("Redis cache write error: %s", e)
+
+def redis_memoize(ttl, key):
+    """Cache a function's JSON-serialisable result in Redis under key(*args)
+    
+    Exceptions are not cached - they propagate to the caller as usual.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cache_key = key(*args, **kwargs)
+            cached = cache_get(cache_key)
+            if cached is not None:
+                return orjson.loads(cached)
+            result = func(*args, **kwargs)
+            cache_set(cache_key, ttl, orjson.dumps(result))
+            return result
+        return wrapper
+    return decorator
+
+def _email_cache_key(email):
+    return f"email_exists:{email.strip().lower()}"
+
+def cache_email_exists(email, exists):
+    """Remember whether an email is registered so repeat probes skip Supabase"""
+    cache_set(_email_cache_key(email), EMAIL_EXISTS_TTL, '1' if exists else '0')
+
+@functools.lru_cache(maxsize=4096)
+def _email_exists_cached(email, _bucket):
+    """Redis/database lookup, memoized per process for the current time bucket
+    
+    _bucket only makes entries expire: check_email_exists passes the current
+    EMAIL_LOCAL_CACHE_TTL-second window, so older entries are never hit again.
+    Errors propagate and are therefore not cached.
+    """
+    cached = cache_get(_email_cache_key(email))
+    if cached is not None:
+        return cached == b'1'
+    
+    if engine is not None:
+        exists = db.fetch_one("SELECT 1 FROM users WHERE email = :email LIMIT 1", conn=db_connection(),
+                              email=email) is not None
+    else:
+        supabase = get_supabase()
         if not supabase:
             return False
-        response = supabase.table('users').select('email').eq('email', email.strip().lower()).execute()
-        return len(response.data) > 0
+        response = supabase.table('users').select('email').eq('email', email).limit(1).execute()
+        exists = len(response.data) > 0
+    cache_email_exists(email, exists)
+    return exists
+
+def check_email_exists(email):
+    """Check if email already exists using Supabase (cached locally and in Redis)"""
+    try:
+        return _email_exists_cached(email.strip().lower(), int(time.time() // EMAIL_LOCAL_CACHE_TTL))
     except Exception as e:
-        print(f"Error checking email: {e}")
+        logger.error("Error checking email: %s", e)
         return False
 
 def create_user(full_name, email, password):
-    """Create a new user in Supabase"""
+    """Create a new user in Supabase
+    
+    A single INSERT ... ON CONFLICT (email) DO NOTHING: an existing email
+    comes back as an empty result instead of needing a lookup first.
+    """
     try:
+        supabase = get_supabase()
         if not supabase:
             return False, "Database connection not available"
-            
-        if check_email_exists(email):
-            return False, "Email already registered"
         
-        password_hash = generate_password_hash(password)
+        password_hash = pwd_ctx.hash(password)
         
         user_data = {
             "full_name": full_name.strip(),
@@ -126,115 +434,426 @@ def create_user(full_name, email, password):
             "password_hash": password_hash
         }
         
-        print(f"Creating user: {email}")
-        response = supabase.table('users').insert(user_data).execute()
+        logger.info("Creating user: %s", email)
+        response = supabase.table('users').upsert(user_data, on_conflict='email', ignore_duplicates=True).execute()
         
         if response.data and len(response.data) > 0:
-            print(f"✅ User created successfully: ID {response.data[0]['id']}")
+            logger.info("✅ User created successfully: ID %s", response.data[0]['id'])
+            cache_email_exists(email, True)
+            _email_exists_cached.cache_clear()
             return True, "User created successfully"
         else:
-            print(f"❌ No data returned: {response}")
-            return False, "Error creating user - no data returned"
+            # Conflict on email - nothing was inserted
+            cache_email_exists(email, True)
+            return False, "Email already registered"
         
     except Exception as e:
-        print(f"❌ Error creating user: {e}")
+        logger.error("❌ Error creating user: %s", e)
         error_str = str(e).lower()
-        if "duplicate" in error_str or "unique" in error_str:
+        if getattr(e, 'code', None) == PG_UNIQUE_VIOLATION or "duplicate" in error_str or "unique" in error_str:
+            cache_email_exists(email, True)
             return False, "Email already registered"
         return False, "Error creating account. Please try again."
 
-def verify_user(email, password):
-    """Verify user credentials using Supabase"""
+# Successful verifications, keyed by (stored hash, HMAC of the password), so a
+# repeat login skips the deliberately slow KDF. Plain passwords are never kept,
+# and a changed hash simply misses.
+_verified_passwords = LRUCache(maxsize=4096)
+_verified_passwords_lock = threading.Lock()
+
+def _password_fingerprint(password):
+    return hmac.new(app.secret_key.encode(), password.encode(), hashlib.sha256).digest()
+
+def verify_password(password_hash, password):
+    """Check a password against a stored hash
+    
+    Returns (matches, new_hash); new_hash is set when the stored hash is a
+    legacy Werkzeug hash or uses outdated argon2 settings and should be replaced.
+    """
+    cache_key = (password_hash, _password_fingerprint(password))
+    with _verified_passwords_lock:
+        if cache_key in _verified_passwords:
+            return True, None
+    if pwd_ctx.identify(password_hash) is None:
+        if check_password_hash(password_hash, password):
+            return True, pwd_ctx.hash(password)
+        return False, None
+    matches, new_hash = pwd_ctx.verify_and_update(password, password_hash)
+    if matches and new_hash is None:
+        with _verified_passwords_lock:
+            _verified_passwords[cache_key] = True
+    return matches, new_hash
+
+def update_password_hash(user_id, password_hash):
+    """Store an upgraded password hash for a user"""
     try:
+        if engine is not None:
+            db.execute("UPDATE users SET password_hash = :password_hash WHERE id = :id",
+                       password_hash=password_hash, id=user_id)
+            return
+        supabase = get_supabase()
         if not supabase:
-            return None
-        response = supabase.table('users').select('*').eq('email', email.strip().lower()).execute()
+            return
+        supabase.table('users').update({
+            "password_hash": password_hash
+        }).eq('id', user_id).execute()
+    except Exception as e:
+        logger.error("Error updating password hash: %s", e)
+
+def verify_user(email, password):
+    """Verify user credentials using Supabase
+    
+    Returns a (status, user) tuple from a single query, where status is
+    "ok", "bad_password" or "no_user" - so callers don't need a second
+    lookup to explain a failed login.
+    """
+    try:
+        # Emails recently confirmed as unregistered skip the lookup and hashing
+        if cache_get(_email_cache_key(email)) == b'0':
+            return "no_user", None
         
-        if response.data:
-            user = response.data[0]
-            if check_password_hash(user['password_hash'], password):
-                return user
-        return None
+        if engine is not None:
+            user = db.fetch_one(f"SELECT {AUTH_COLUMNS} FROM users WHERE email = :email LIMIT 1", conn=db_connection(),
+                                email=email.strip().lower())
+        else:
+            supabase = get_supabase()
+            if not supabase:
+                return "no_user", None
+            response = supabase.table('users').select(AUTH_COLUMNS).eq('email', email.strip().lower()).limit(1).execute()
+            user = response.data[0] if response.data else None
+        
+        if not user:
+            cache_email_exists(email, False)
+            return "no_user", None
+        cache_email_exists(email, True)
+        matches, new_hash = verify_password(user['password_hash'], password)
+        if not matches:
+            return "bad_password", None
+        if new_hash:
+            update_password_hash(user['id'], new_hash)
+        return "ok", user
     except Exception as e:
-        print(f"Error verifying user: {e}")
-        return None
+        logger.error("Error verifying user: %s", e)
+        return "no_user", None
 
+@celery.task
 def update_last_login(user_id):
-    """Update user's last login timestamp"""
+    """Update user's last login timestamp (Celery task - call with .delay)"""
     try:
+        last_login = datetime.now(timezone.utc).isoformat()
+        if engine is not None:
+            db.execute("UPDATE users SET last_login = :last_login WHERE id = :id",
+                       last_login=last_login, id=user_id)
+            return
+        supabase = get_supabase()
         if not supabase:
             return
         supabase.table('users').update({
-            "last_login": datetime.now(timezone.utc).isoformat()
+            "last_login": last_login
         }).eq('id', user_id).execute()
     except Exception as e:
-        print(f"Error updating last login: {e}")
+        logger.error("Error updating last login: %s", e)
 
-def get_user_by_id(user_id):
-    """Get user by ID from Supabase"""
+# Short-lived, process-local cache of profile rows. Warm instances serve the
+# same user many times a minute (page load + AJAX calls), so most lookups
+# never leave the process. Maps user_id -> {columns: row} so one pop drops
+# every projection; invalidated by update_user_profile.
+_user_cache = TTLCache(maxsize=4096, ttl=USER_CACHE_TTL)
+_user_cache_lock = threading.RLock()
+
+# Behind it, a Redis hash user:{id} (one field per column list) shared by all
+# instances, so a cold instance still skips the database
+def _user_redis_key(user_id):
+    return f"user:{user_id}"
+
+def _user_redis_get(user_id, columns):
+    if not redis_client:
+        return None
     try:
-        if not supabase:
-            return None
-        response = supabase.table('users').select('*').eq('id', user_id).execute()
-        return response.data[0] if response.data else None
+        cached = redis_client.hget(_user_redis_key(user_id), columns)
+        return orjson.loads(cached) if cached is not None else None
     except Exception as e:
-        print(f"Error getting user by ID: {e}")
+        logger.warning("Redis cache read error: %s", e)
         return None
 
+def _user_redis_set(user_id, projections, replace=False):
+    if not redis_client:
+        return
+    try:
+        key = _user_redis_key(user_id)
+        pipe = redis_client.pipeline()
+        if replace:
+            pipe.delete(key)
+        pipe.hset(key, mapping={columns: orjson.dumps(row, default=_flask_json_default)
+                                for columns, row in projections.items()})
+        pipe.expire(key, USER_REDIS_CACHE_TTL)
+        pipe.execute()
+    except Exception as e:
+        logger.warning("Redis cache write error: %s", e)
+
+def _user_redis_delete(user_id):
+    if not redis_client:
+        return
+    try:
+        redis_client.delete(_user_redis_key(user_id))
+    except Exception as e:
+        logger.warning("Redis cache write error: %s", e)
+
+def get_user_by_id(user_id, columns=USER_PROFILE_COLUMNS):
+    """Get user by ID from Supabase, selecting only the given columns"""
+    with _user_cache_lock:
+        user = _user_cache.get(user_id, {}).get(columns)
+    if user is not None:
+        return user
+    user = _user_redis_get(user_id, columns)
+    if user is not None:
+        with _user_cache_lock:
+            _user_cache.setdefault(user_id, {})[columns] = user
+        return user
+    try:
+        if engine is not None:
+            user = db.fetch_one(f"SELECT {columns} FROM users WHERE id = :id", conn=db_connection(), id=user_id)
+        else:
+            supabase = get_supabase()
+            if not supabase:
+                return None
+            response = supabase.table('users').select(columns).eq('id', user_id).limit(1).execute()
+            user = response.data[0] if response.data else None
+    except Exception as e:
+        logger.error("Error getting user by ID: %s", e)
+        return None
+    if user is not None:
+        with _user_cache_lock:
+            _user_cache.setdefault(user_id, {})[columns] = user
+        _user_redis_set(user_id, {columns: user})
+    return user
+
+def invalidate_user_cache(user_id):
+    """Drop a cached profile row after it has been written"""
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+    _user_redis_delete(user_id)
+
+def project_columns(row, columns):
+    """Cut a full users row down to a column list like USER_PROFILE_COLUMNS"""
+    return {column.strip(): row.get(column.strip()) for column in columns.split(',')}
+
+def prime_user_cache(user_id, row):
+    """Replace a user's cached projections with ones cut from a freshly written full row"""
+    projections = {
+        columns: project_columns(row, columns)
+        for columns in (USER_PROFILE_COLUMNS, USER_RECOMMENDATION_COLUMNS)
+    }
+    with _user_cache_lock:
+        _user_cache[user_id] = projections
+    _user_redis_set(user_id, projections, replace=True)
+
+def current_user(columns=USER_PROFILE_COLUMNS):
+    """Return the logged-in user's profile, fetched at most once per request"""
+    if 'users' not in g:
+        g.users = {}
+    if columns not in g.users:
+        g.users[columns] = get_user_by_id(session.get('user_id'), columns)
+    return g.users[columns]
+
+def recommendation_profile():
+    """Profile fields for the recommendation views
+    
+    A completed profile is kept in the session on save, so the common case
+    needs no database read; otherwise fall back to the (cached) lookup. The
+    copy is only trusted while it belongs to the logged-in user.
+    """
+    profile = session.get('profile')
+    if profile and profile.get('profile_completed') and profile.get('id') == session.get('user_id'):
+        return profile
+    return current_user(USER_RECOMMENDATION_COLUMNS)
+
 def update_user_profile(user_id, profile_data):
-    """Update user profile in Supabase"""
+    """Update user profile in Supabase and return the updated row (None on failure)
+    
+    Goes through the update_user_profile_jsonb database function, which
+    keeps the stored value for empty/None fields; those are dropped here
+    already, and a patch with nothing left skips the write entirely. The
+    function returns the written row, which replaces the cached profile so
+    the next page load needs no read.
+    """
+    patch = {key: value for key, value in profile_data.items() if value not in (None, '')}
+    if not patch:
+        return get_user_by_id(user_id)
+    
+    updated = None
     try:
-        if not supabase:
-            return False
-        clean_data = {}
-        for key, value in profile_data.items():
-            if value is not None and value != '':
-                clean_data[key] = value
-        
-        response = supabase.table('users').update(clean_data).eq('id', user_id).execute()
-        return len(response.data) > 0
+        if engine is not None:
+            updated = db.execute_returning(
+                "SELECT * FROM update_user_profile_jsonb(:uid, CAST(:patch AS jsonb))",
+                uid=user_id, patch=orjson.dumps(patch).decode())
+        else:
+            supabase = get_supabase()
+            if not supabase:
+                return None
+            response = supabase.rpc('update_user_profile_jsonb', {'uid': user_id, 'patch': patch}).execute()
+            updated = response.data[0] if response.data else None
+        return updated
     except Exception as e:
-        print(f"Error updating user profile: {e}")
-        return False
+        logger.error("Error updating user profile: %s", e)
+        return None
+    finally:
+        if updated:
+            prime_user_cache(user_id, updated)
+        else:
+            invalidate_user_cache(user_id)
 
-def log_conversation(user_message, bot_response, user_id=None):
-    """Log conversations using Supabase"""
+@celery.task
+def log_conversations(chat_rows):
+    """Insert a batch of chat log rows using Supabase (Celery task - call with .delay)"""
     try:
+        if engine is not None:
+            db.execute_many("INSERT INTO chat_logs (user_id, user_message, bot_response) "
+                            "VALUES (:user_id, :user_message, :bot_response)", chat_rows)
+            return
+        supabase = get_supabase()
         if not supabase:
             return
-        chat_data = {
-            "user_id": user_id,
-            "user_message": user_message,
-            "bot_response": bot_response
-        }
-        supabase.table('chat_logs').insert(chat_data).execute()
+        supabase.table('chat_logs').insert(chat_rows).execute()
     except Exception as e:
-        print(f"Logging error: {e}")
+        logger.error("Logging error: %s", e)
+
+# Chat logs are queued in-process and written in batches by a daemon thread,
+# so /chat never waits on the insert (not even when Celery runs eagerly)
+_chat_log_queue = queue.Queue(maxsize=CHAT_LOG_QUEUE_MAX)
+# Queued by the exit handler: the writer flushes the batch it holds and stops
+_CHAT_LOG_STOP = object()
+_chat_log_writer = None
+
+def _drain_chat_logs():
+    """Background writer: block for one row, then collect more until the batch
+    is full or CHAT_LOG_FLUSH_INTERVAL has passed, and insert them together"""
+    while True:
+        chat_row = _chat_log_queue.get()
+        if chat_row is _CHAT_LOG_STOP:
+            return
+        chat_rows = [chat_row]
+        stopping = False
+        deadline = time.monotonic() + CHAT_LOG_FLUSH_INTERVAL
+        while len(chat_rows) < CHAT_LOG_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                chat_row = _chat_log_queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if chat_row is _CHAT_LOG_STOP:
+                stopping = True
+                break
+            chat_rows.append(chat_row)
+        try:
+            log_conversations.delay(chat_rows)
+        except Exception:
+            # Keep the writer alive; this batch is lost but later ones aren't
+            logger.exception("Chat log batch of %d rows failed", len(chat_rows))
+        if stopping:
+            return
+
+if BACKGROUND_THREADS:
+    _chat_log_writer = threading.Thread(target=_drain_chat_logs, name="chat-log-writer", daemon=True)
+    _chat_log_writer.start()
+
+def _flush_background_writes():
+    """On interpreter exit, let the chat log writer flush the batch it holds,
+    write anything still queued and wait for pending background writes"""
+    if _chat_log_writer is not None and _chat_log_writer.is_alive():
+        try:
+            _chat_log_queue.put(_CHAT_LOG_STOP, timeout=10)
+            _chat_log_writer.join(timeout=10)
+        except queue.Full:
+            pass
+    chat_rows = []
+    while True:
+        try:
+            chat_row = _chat_log_queue.get_nowait()
+        except queue.Empty:
+            break
+        if chat_row is not _CHAT_LOG_STOP:
+            chat_rows.append(chat_row)
+    if chat_rows:
+        log_conversations(chat_rows)
+    _background_executor.shutdown(wait=True)
+
+atexit.register(_flush_background_writes)
+
+def log_conversation(user_message, bot_response, user_id=None):
+    """Queue a conversation for the background chat log writer"""
+    chat_row = {
+        "user_id": user_id,
+        "user_message": user_message,
+        "bot_response": bot_response
+    }
+    if BACKGROUND_THREADS:
+        try:
+            _chat_log_queue.put_nowait(chat_row)
+        except queue.Full:
+            logger.warning("Chat log queue full, dropping conversation log")
+    else:
+        log_conversations.delay([chat_row])
+
+# Validation patterns, compiled once at import
+_RE_EMAIL = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_PASSWORD_SPECIAL_CHARS = frozenset('!@#$%^&*(),.?":{}|<>')
+_PW_UPPER, _PW_LOWER, _PW_DIGIT, _PW_SPECIAL = 0x1, 0x2, 0x4, 0x8
+_PW_ALL = _PW_UPPER | _PW_LOWER | _PW_DIGIT | _PW_SPECIAL
+
+def _build_password_class_table():
+    """Map every byte value to its character-class bit (0 for anything else)"""
+    table = bytearray(256)
+    for c in range(ord('A'), ord('Z') + 1):
+        table[c] = _PW_UPPER
+    for c in range(ord('a'), ord('z') + 1):
+        table[c] = _PW_LOWER
+    for c in range(ord('0'), ord('9') + 1):
+        table[c] = _PW_DIGIT
+    for ch in _PASSWORD_SPECIAL_CHARS:
+        table[ord(ch)] = _PW_SPECIAL
+    return bytes(table)
+
+_PW_CLASS_TABLE = _build_password_class_table()
 
 def validate_password(password):
-    """Validate password strength"""
+    """Validate password strength (single pass over the characters)"""
     if len(password) < 8:
         return False, "Password must be at least 8 characters long"
-    if not re.search(r'[A-Z]', password):
+    
+    flags = 0
+    for b in password.encode():
+        flags |= _PW_CLASS_TABLE[b]
+        if flags == _PW_ALL:
+            break
+    
+    if not flags & _PW_UPPER:
         return False, "Password must contain an uppercase letter"
-    if not re.search(r'[a-z]', password):
+    if not flags & _PW_LOWER:
         return False, "Password must contain a lowercase letter"
-    if not re.search(r'\d', password):
+    if not flags & _PW_DIGIT:
         return False, "Password must contain a number"
-    if not re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
+    if not flags & _PW_SPECIAL:
         return False, "Password must contain a special character"
     return True, "Password is valid"
 
 def validate_email(email):
     """Validate email format"""
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-    return re.match(pattern, email) is not None
+    return _RE_EMAIL.match(email) is not None
+
+def _f(value):
+    """Parse an optional numeric form value"""
+    return float(value) if value else None
 
 def get_user_initials(full_name):
     """Get user initials from full name"""
     if not full_name or full_name == 'User':
         return "U"
-    names = full_name.strip().split()
+    names = full_name.split()
+    if not names:
+        return "U"
     if len(names) >= 2:
         return (names[0][0] + names[-1][0]).upper()
     else:
@@ -245,54 +864,193 @@ def get_user_display_name(full_name, email):
     if full_name and full_name != 'User':
         return full_name
     else:
-        return email.split('@')[0].title()
+        return email.partition('@')[0].title()
+
+def _gemini_cache_key(user_message):
+    """Cache key for a chat question, or None if its answer must not be cached"""
+    question = ' '.join(user_message.lower().split())
+    if TIME_SENSITIVE_QUESTION.search(question):
+        return None
+    # Keyed by the prompt template as well, so edits to the context or
+    # instructions never serve answers written for an older prompt
+    digest = _chat_prompt_hash.copy()
+    digest.update(question.encode())
+    return "gemini:" + digest.hexdigest()
+
+def gemini_cache_get(cache_key):
+    """Cached answer (still containing USER_NAME_TOKEN) or None"""
+    if cache_key is None:
+        return None
+    with _gemini_answers_lock:
+        reply = _gemini_answers.get(cache_key)
+    if reply is None:
+        cached = cache_get(cache_key)
+        if cached is not None:
+            reply = cached.decode()
+            with _gemini_answers_lock:
+                _gemini_answers[cache_key] = reply
+    return reply
 
-def get_gemini_response(user_message, user_name="User", user_email=""):
-    """Get response from Google Gemini with PM Internship context"""
+def gemini_cache_set(cache_key, reply):
+    """Store an answer in both cache tiers (no-op for uncacheable questions)"""
+    if cache_key is None:
+        return
+    with _gemini_answers_lock:
+        _gemini_answers[cache_key] = reply
+    cache_set(cache_key, GEMINI_CACHE_TTL, reply)
+
+def _build_chat_prompt(user_message):
+    return CHAT_PROMPT_HEAD + user_message + CHAT_PROMPT_TAIL
+
+def _split_partial_name_token(text):
+    """Split streamed text into a part safe to send and a tail that may be the
+    start of USER_NAME_TOKEN (completed by the next chunk)"""
+    cut = text.rfind(USER_NAME_TOKEN[0])
+    if cut != -1 and USER_NAME_TOKEN.startswith(text[cut:]):
+        return text[:cut], text[cut:]
+    return text, ''
+
+def get_gemini_response(user_message, user_name="User"):
+    """Get response from Google Gemini with PM Internship context
+    
+    Answers are cached in-process and in Redis by question text (except
+    time-sensitive questions). The prompt carries no personal details; the
+    user's name is filled in after the cache lookup.
+    """
     try:
-        full_prompt = f"""
-        {INTERNSHIP_CONTEXT}
-        
-        The user's name is {user_name} and their email is {user_email}. 
-        Address them personally when appropriate.
-        
-        User question: {user_message}
-        
-        Provide a helpful response about the PM Internship Scheme:
-        """
+        cache_key = _gemini_cache_key(user_message)
+        cached = gemini_cache_get(cache_key)
+        if cached is not None:
+            return cached.replace(USER_NAME_TOKEN, user_name)
         
         response = model.generate_content(
-            full_prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=400,
-                temperature=0.7,
-            )
+            _build_chat_prompt(user_message),
+            generation_config=CHAT_GENERATION_CONFIG
         )
         
-        return response.text.strip()
+        reply = response.text.strip()
+        gemini_cache_set(cache_key, reply)
+        return reply.replace(USER_NAME_TOKEN, user_name)
         
     except Exception as e:
-        print(f"Gemini API error: {e}")
+        logger.error("Gemini API error: %s", e)
         return get_fallback_response(user_message)
 
+def stream_gemini_response(user_message, user_name="User"):
+    """Yield a Gemini answer piece by piece as it is generated
+    
+    Uses the same prompt and cache as get_gemini_response; a cached answer
+    is sent in one piece. Falls back to get_fallback_response if Gemini
+    fails before anything was sent.
+    """
+    cache_key = _gemini_cache_key(user_message)
+    cached = gemini_cache_get(cache_key)
+    if cached is not None:
+        yield cached.replace(USER_NAME_TOKEN, user_name)
+        return
+    
+    parts = []
+    pending = ''
+    try:
+        response = model.generate_content(
+            _build_chat_prompt(user_message),
+            generation_config=CHAT_GENERATION_CONFIG,
+            stream=True
+        )
+        for chunk in response:
+            parts.append(chunk.text)
+            pending = (pending + chunk.text).replace(USER_NAME_TOKEN, user_name)
+            ready, pending = _split_partial_name_token(pending)
+            if ready:
+                yield ready
+        if pending:
+            yield pending
+        
+        gemini_cache_set(cache_key, ''.join(parts).strip())
+    
+    except Exception as e:
+        logger.error("Gemini streaming error: %s", e)
+        if not parts:
+            yield get_fallback_response(user_message)
+
+# Keyword sets for the offline fallback, matched against whole words of the message
+_RE_WORD = re.compile(r"[a-z]+")
+FALLBACK_GREETING_WORDS = frozenset({'hi', 'hello', 'hey', 'namaste'})
+FALLBACK_APPLY_WORDS = frozenset({'apply', 'application', 'applications'})
+FALLBACK_ELIGIBILITY_WORDS = frozenset({'eligible', 'eligibility', 'criteria'})
+FALLBACK_BENEFIT_WORDS = frozenset({'stipend', 'stipends', 'benefit', 'benefits', 'salary', 'money'})
+FALLBACK_SUPPORT_WORDS = frozenset({'help', 'support', 'contact'})
+
 def get_fallback_response(message):
     """Enhanced fallback responses"""
     message_lower = message.lower()
+    words = set(_RE_WORD.findall(message_lower))
     
-    if any(word in message_lower for word in ['hi', 'hello', 'hey', 'namaste']):
+    if words & FALLBACK_GREETING_WORDS:
         return "👋 Hello! I'm your PM Internship Assistant. How can I help you today?"
-    elif any(word in message_lower for word in ['apply', 'application', 'how to']):
+    elif words & FALLBACK_APPLY_WORDS or 'how to' in message_lower:
         return "🎯 **Application Process:**\n1️⃣ Check eligibility criteria\n2️⃣ Register on portal\n3️⃣ Fill application form\n4️⃣ Upload documents\n5️⃣ Submit application\n\n📱 Visit the Apply section for detailed steps!"
-    elif any(word in message_lower for word in ['eligible', 'eligibility', 'criteria']):
+    elif words & FALLBACK_ELIGIBILITY_WORDS:
         return "✅ **Eligibility Checklist:**\n🔹 Age: 21-24 years\n🔹 Indian citizen\n🔹 Not in full-time work/education\n🔹 Family income < ₹8 lakhs\n🔹 No govt job in family"
-    elif any(word in message_lower for word in ['stipend', 'benefit', 'salary', 'money']):
+    elif words & FALLBACK_BENEFIT_WORDS:
         return "💰 **Amazing Benefits:**\n💵 ₹5,000 monthly stipend\n🎁 ₹6,000 one-time grant\n🏥 Health insurance\n📜 Official certificate\n🌟 Industry mentorship"
-    elif any(word in message_lower for word in ['help', 'support', 'contact']):
+    elif words & FALLBACK_SUPPORT_WORDS:
         return "📞 **Need Help?**\n📧 Email: contact-pminternship@gov.in\n☎️ Phone: 011-12345678\n🕒 Mon-Fri: 10 AM - 6 PM"
     else:
         return "🤖 I can help you with:\n🔹 Eligibility criteria\n🔹 Application process\n🔹 Benefits & stipend\n🔹 Required documents\n🔹 Contact support\n\nWhat would you like to know?"
 
 # ENHANCED: Skill Matching Algorithm with Government Priority
+SKILL_SIMILARITY_CUTOFF = 80  # fuzzy match threshold, in percent
+SKILL_VARIATIONS = {
+    'python': frozenset({'py', 'python3', 'python programming'}),
+    'javascript': frozenset({'js', 'node.js', 'nodejs', 'react', 'angular', 'vue'}),
+    'java': frozenset({'java programming', 'core java', 'advanced java'}),
+    'sql': frozenset({'mysql', 'postgresql', 'database', 'rdbms'}),
+    'machine learning': frozenset({'ml', 'ai', 'artificial intelligence', 'deep learning'}),
+    'data analysis': frozenset({'data science', 'analytics', 'statistics'}),
+    'web development': frozenset({'html', 'css', 'frontend', 'backend'}),
+    'communication': frozenset({'english', 'presentation', 'speaking'}),
+}
+# Reverse index: variation -> base skill
+SKILL_VARIATION_TO_BASE = {
+    variation: base_skill
+    for base_skill, variations in SKILL_VARIATIONS.items()
+    for variation in variations
+}
+
+@functools.lru_cache(maxsize=2048)
+def _skill_match_total(user_skills, required_skills):
+    """Sum over required skills of the best match among the user's skills (0-1 each)
+    
+    Takes tuples so results can be memoized: the same profile is scored
+    against the same postings on every page load.
+    """
+    # Required skills the user lists verbatim score 1.0 outright; only the
+    # rest need the fuzzy/containment/variation matrices below
+    user_skill_set = frozenset(user_skills)
+    exact_matches = sum(1 for req_skill in required_skills if req_skill in user_skill_set)
+    required_skills = [req_skill for req_skill in required_skills if req_skill not in user_skill_set]
+    if not required_skills:
+        return float(exact_matches)
+    
+    # Similarity of every (required, user) skill pair in one C call; pairs
+    # below the 80% threshold come back as 0
+    similarity = process.cdist(required_skills, user_skills, scorer=fuzz.ratio,
+                               score_cutoff=SKILL_SIMILARITY_CUTOFF) / 100.0
+    # Score floors from the cheap rules, built in one pass over the pairs:
+    # [..., 0] = 0.9 if one skill contains the other, [..., 1] = 0.95 for a
+    # known variation
+    user_bases = [SKILL_VARIATION_TO_BASE.get(user_skill) for user_skill in user_skills]
+    req_bases = [SKILL_VARIATION_TO_BASE.get(req_skill) for req_skill in required_skills]
+    floors = np.array([[(0.9 if req_skill in user_skill or user_skill in req_skill else 0.0,
+                         0.95 if user_base == req_skill or req_base == user_skill else 0.0)
+                        for user_skill, user_base in zip(user_skills, user_bases)]
+                       for req_skill, req_base in zip(required_skills, req_bases)])
+    
+    # Fuzzy match wins over containment; a known variation counts at least 0.95
+    pair_scores = np.maximum(np.where(similarity > 0.8, similarity, floors[..., 0]), floors[..., 1])
+    return exact_matches + float(pair_scores.max(axis=1).sum())
+
 def calculate_skill_match_score(user_skills_string, required_skills_list, user_profile=None):
     """
     Calculate skill match percentage between user and job requirements
@@ -308,45 +1066,8 @@ def calculate_skill_match_score(user_skills_string, required_skills_list, user_p
     if not user_skills or not required_skills:
         return 0
     
-    match_score = 0
     total_weight = len(required_skills)
-    
-    for req_skill in required_skills:
-        best_match_score = 0
-        
-        for user_skill in user_skills:
-            # Exact match
-            if user_skill == req_skill:
-                best_match_score = 1.0
-                break
-            
-            # Partial match using fuzzy matching
-            similarity = difflib.SequenceMatcher(None, user_skill, req_skill).ratio()
-            if similarity > 0.8:  # 80% similarity threshold
-                best_match_score = max(best_match_score, similarity)
-            
-            # Check if one skill contains another
-            elif req_skill in user_skill or user_skill in req_skill:
-                best_match_score = max(best_match_score, 0.9)
-            
-            # Common skill variations
-            skill_variations = {
-                'python': ['py', 'python3', 'python programming'],
-                'javascript': ['js', 'node.js', 'nodejs', 'react', 'angular', 'vue'],
-                'java': ['java programming', 'core java', 'advanced java'],
-                'sql': ['mysql', 'postgresql', 'database', 'rdbms'],
-                'machine learning': ['ml', 'ai', 'artificial intelligence', 'deep learning'],
-                'data analysis': ['data science', 'analytics', 'statistics'],
-                'web development': ['html', 'css', 'frontend', 'backend'],
-                'communication': ['english', 'presentation', 'speaking'],
-            }
-            
-            for base_skill, variations in skill_variations.items():
-                if (req_skill == base_skill and user_skill in variations) or \
-                   (user_skill == base_skill and req_skill in variations):
-                    best_match_score = max(best_match_score, 0.95)
-        
-        match_score += best_match_score
+    match_score = _skill_match_total(tuple(user_skills), tuple(required_skills))
     
     # Calculate percentage
     percentage = (match_score / total_weight) * 100
@@ -395,272 +1116,319 @@ def sort_recommendations_by_match(recommendations, user):
             user
         )
         
-        # Add the match score to the recommendation
-        rec['skill_match_score'] = match_score
-        
         if rec.get('type') == 'government':
             # Government internships get bonus (10 points for priority)
             boosted_score = min(100, match_score + 10)
-            rec['skill_match_score'] = boosted_score
             government_recs.append((boosted_score, rec))
         else:
             service_recs.append((match_score, rec))
     
-    # Sort each category by match score
-    government_recs.sort(key=lambda x: x[0], reverse=True)
-    service_recs.sort(key=lambda x: x[0], reverse=True)
+    by_score = operator.itemgetter(0)
     
     # Create balanced top 5: 3 government + 2 service-based (or best available mix)
-    top_recommendations = []
-    
     # Add top government recommendations (max 3)
-    gov_count = 0
-    for score, rec in government_recs:
-        if gov_count < 3:
-            top_recommendations.append(rec)
-            gov_count += 1
-    
-    # Add top service-based recommendations (fill remaining spots)
-    service_count = 0
-    for score, rec in service_recs:
-        if len(top_recommendations) < 5 and service_count < 3:
-            top_recommendations.append(rec)
-            service_count += 1
+    top_recommendations = heapq.nlargest(3, government_recs, key=by_score)
+    gov_count = len(top_recommendations)
+    
+    # Add top service-based recommendations (fill remaining spots, max 3)
+    top_recommendations += heapq.nlargest(min(3, 5 - gov_count), service_recs, key=by_score)
     
     # If we still need more and have remaining government ones
     if len(top_recommendations) < 5 and gov_count < len(government_recs):
-        for score, rec in government_recs[gov_count:]:
-            if len(top_recommendations) < 5:
-                top_recommendations.append(rec)
+        needed = 5 - len(top_recommendations)
+        top_recommendations += heapq.nlargest(gov_count + needed, government_recs, key=by_score)[gov_count:]
     
-    # Final sort by skill_match_score to maintain quality order within the balanced set
-    top_recommendations.sort(key=lambda x: x.get('skill_match_score', 0), reverse=True)
+    # Final order by skill_match_score to maintain quality order within the balanced set
+    top_recommendations = heapq.nlargest(5, top_recommendations, key=by_score)
     
-    return top_recommendations[:5]
+    # Copy only the returned entries, with their score attached
+    return [dict(rec, skill_match_score=score) for score, rec in top_recommendations]
+
+# BALANCED POOL: Equal mix of government and service-based opportunities.
+# Built once at import as read-only entries; sort_recommendations_by_match
+# copies only the ones it returns.
+DEFAULT_RECOMMENDATIONS = (
+    # GOVERNMENT INTERNSHIPS (7 options - high quality)
+    MappingProxyType({
+        "company": "ISRO",
+        "title": "Space Technology Research Intern",
+        "type": "government",
+        "sector": "Space Technology & Research",
+        "skills": ("Programming", "Research", "Data Analysis", "MATLAB", "Python"),
+        "duration": "6 Months",
+        "location": "Bangalore/Thiruvananthapuram",
+        "stipend": "₹25,000/month",
+        "description": "🚀 Join India's premier space agency! Work on cutting-edge satellite technology and space missions. Contribute to national space research programs."
+    }),
+    MappingProxyType({
+        "company": "DRDO",
+        "title": "Defence Technology Intern",
+        "type": "government",
+        "sector": "Defence Research & Development",
+        "skills": ("Research", "Engineering", "Technical Analysis", "Problem Solving", "Innovation"),
+        "duration": "4 Months",
+        "location": "Delhi/Pune/Hyderabad",
+        "stipend": "₹22,000/month",
+        "description": "🛡️ Shape India's defence future! Work on advanced defence technologies and contribute to national security research projects."
+    }),
+    MappingProxyType({
+        "company": "NITI Aayog",
+        "title": "Policy Research & Analysis Intern",
+        "type": "government",
+        "sector": "Public Policy & Governance",
+        "skills": ("Research", "Policy Analysis", "Data Interpretation", "Report Writing", "Communication"),
+        "duration": "4 Months",
+        "location": "New Delhi",
+        "stipend": "₹20,000/month",
+        "description": "🏛️ Impact India's development! Research policy solutions and contribute to national development strategies."
+    }),
+    MappingProxyType({
+        "company": "Indian Railways",
+        "title": "Railway Operations & Technology Intern",
+        "type": "government",
+        "sector": "Transportation & Logistics",
+        "skills": ("Operations Management", "Logistics", "Engineering", "Project Management", "Data Analysis"),
+        "duration": "5 Months",
+        "location": "Multiple Cities",
+        "stipend": "₹18,000/month",
+        "description": "🚂 Power India's lifeline! Learn operations of world's largest railway network."
+    }),
+    MappingProxyType({
+        "company": "CSIR Labs",
+        "title": "Scientific Research Intern",
+        "type": "government",
+        "sector": "Scientific Research",
+        "skills": ("Research", "Data Analysis", "Laboratory Skills", "Scientific Writing", "Innovation"),
+        "duration": "6 Months",
+        "location": "Multiple CSIR Centers",
+        "stipend": "₹24,000/month",
+        "description": "🔬 Advance scientific knowledge! Work with India's premier scientific research organization."
+    }),
+    MappingProxyType({
+        "company": "Ministry of Electronics & IT",
+        "title": "Digital India Technology Intern",
+        "type": "government",
+        "sector": "Digital Governance",
+        "skills": ("Programming", "Digital Literacy", "Web Development", "Data Management", "Cybersecurity"),
+        "duration": "4 Months",
+        "location": "New Delhi/Pune",
+        "stipend": "₹21,000/month",
+        "description": "💻 Build Digital India! Contribute to nation's digital transformation and e-governance initiatives."
+    }),
+    MappingProxyType({
+        "company": "BARC",
+        "title": "Nuclear Technology Research Intern",
+        "type": "government",
+        "sector": "Nuclear Research",
+        "skills": ("Engineering", "Research", "Data Analysis", "Safety Protocols", "Technical Documentation"),
+        "duration": "5 Months",
+        "location": "Mumbai/Kalpakkam",
+        "stipend": "₹26,000/month",
+        "description": "⚛️ Power India's future! Work on nuclear technology and contribute to clean energy research."
+    }),
+
+    # PRIVATE-BASED INTERNSHIPS (8 options - high quality with competitive stipends)
+    MappingProxyType({
+        "company": "TCS (Tata Consultancy Services)",
+        "title": "Software Development Intern",
+        "type": "private-based",
+        "sector": "IT Services",
+        "skills": ("Java", "Python", "Programming", "Problem Solving", "Communication"),
+        "duration": "3 Months",
+        "location": "Multiple Cities",
+        "stipend": "₹30,000/month",
+        "description": "💼 Industry leader experience! Work on enterprise software projects with India's largest IT company."
+    }),
+    MappingProxyType({
+        "company": "Infosys",
+        "title": "Digital Innovation Intern",
+        "type": "private-based",
+        "sector": "IT Consulting",
+        "skills": ("Digital Technologies", "Innovation", "Cloud Computing", "Problem Solving", "Teamwork"),
+        "duration": "3 Months",
+        "location": "Bangalore/Pune",
+        "stipend": "₹28,000/month",
+        "description": "🌟 Innovation at scale! Work on cutting-edge digital transformation projects with global impact."
+    }),
+    MappingProxyType({
+        "company": "Wipro",
+        "title": "Technology Solutions Intern",
+        "type": "private-based",
+        "sector": "IT Services",
+        "skills": ("Cloud Computing", "DevOps", "Programming", "Agile", "Learning Agility"),
+        "duration": "4 Months",
+        "location": "Pune/Bangalore",
+        "stipend": "₹32,000/month",
+        "description": "☁️ Future-ready skills! Gain hands-on experience with cloud technologies and modern development practices."
+    }),
+    MappingProxyType({
+        "company": "Microsoft India",
+        "title": "Technology Trainee",
+        "type": "private-based",
+        "sector": "Technology",
+        "skills": ("Programming", "AI/ML", "Cloud Platforms", "Data Science", "Innovation"),
+        "duration": "3 Months",
+        "location": "Hyderabad/Bangalore",
+        "stipend": "₹40,000/month",
+        "description": "🚀 Global technology experience! Work with cutting-edge Microsoft technologies and AI platforms."
+    }),
+    MappingProxyType({
+        "company": "Google India",
+        "title": "Software Engineering Intern",
+        "type": "private-based",
+        "sector": "Technology",
+        "skills": ("Programming", "Algorithms", "Data Structures", "Problem Solving", "Software Design"),
+        "duration": "4 Months",
+        "location": "Bangalore/Gurgaon",
+        "stipend": "₹50,000/month",
+        "description": "🌟 Dream opportunity! Work with world-class engineers on products used by billions."
+    }),
+    MappingProxyType({
+        "company": "Amazon India",
+        "title": "SDE Intern",
+        "type": "private-based",
+        "sector": "E-commerce Technology",
+        "skills": ("Programming", "System Design", "AWS", "Data Structures", "Problem Solving"),
+        "duration": "3 Months",
+        "location": "Bangalore/Hyderabad",
+        "stipend": "₹45,000/month",
+        "description": "📦 Scale at Amazon! Work on systems handling millions of customers and learn cloud technologies."
+    }),
+    MappingProxyType({
+        "company": "HDFC Bank",
+        "title": "Banking Technology Intern",
+        "type": "private-based",
+        "sector": "Financial Services",
+        "skills": ("Financial Technology", "Data Analysis", "Banking Operations", "Communication", "Excel"),
+        "duration": "3 Months",
+        "location": "Mumbai/Pune",
+        "stipend": "₹25,000/month",
+        "description": "🏦 FinTech innovation! Experience digital banking transformation with India's leading private bank."
+    }),
+    MappingProxyType({
+        "company": "Accenture",
+        "title": "Technology Consulting Intern",
+        "type": "private-based",
+        "sector": "IT Consulting",
+        "skills": ("Business Analysis", "Technology Consulting", "Communication", "Problem Solving", "Project Management"),
+        "duration": "4 Months",
+        "location": "Multiple Cities",
+        "stipend": "₹27,000/month",
+        "description": "💡 Consulting excellence! Work with global clients on technology transformation projects."
+    }),
+)
+
+# Profile fields that feed the recommendation prompt and the skill scorer -
+# users with the same values get the same recommendations
+RECOMMENDATION_PROFILE_FIELDS = ('skills', 'area_of_interest', 'qualification', 'prior_internship')
 
+def recommendation_cache_key(prefix):
+    """Build a redis_memoize key function from the user's recommendation-relevant fields"""
+    def key(user):
+        user = user or {}
+        fingerprint = "|".join(str(user.get(field) or '') for field in RECOMMENDATION_PROFILE_FIELDS)
+        return f"{prefix}:" + hashlib.sha1(fingerprint.encode()).hexdigest()
+    return key
+
+@redis_memoize(ttl=RECOMMENDATION_CACHE_TTL, key=recommendation_cache_key("recs:default"))
 def get_enhanced_default_recommendations(user):
     """Enhanced recommendations with BALANCED MIX - Government priority but shows both types"""
-    area_of_interest = user.get('area_of_interest', '').lower() if user else ''
-    skills = user.get('skills', '').lower() if user else ''
-    qualification = user.get('qualification', '').lower() if user else ''
-    
-    # BALANCED POOL: Equal mix of government and service-based opportunities
-    all_recommendations = [
-        # GOVERNMENT INTERNSHIPS (7 options - high quality)
-        {
-            "company": "ISRO",
-            "title": "Space Technology Research Intern",
-            "type": "government",
-            "sector": "Space Technology & Research",
-            "skills": ["Programming", "Research", "Data Analysis", "MATLAB", "Python"],
-            "duration": "6 Months",
-            "location": "Bangalore/Thiruvananthapuram",
-            "stipend": "₹25,000/month",
-            "description": "🚀 Join India's premier space agency! Work on cutting-edge satellite technology and space missions. Contribute to national space research programs."
-        },
-        {
-            "company": "DRDO",
-            "title": "Defence Technology Intern",
-            "type": "government",
-            "sector": "Defence Research & Development",
-            "skills": ["Research", "Engineering", "Technical Analysis", "Problem Solving", "Innovation"],
-            "duration": "4 Months",
-            "location": "Delhi/Pune/Hyderabad",
-            "stipend": "₹22,000/month",
-            "description": "🛡️ Shape India's defence future! Work on advanced defence technologies and contribute to national security research projects."
-        },
-        {
-            "company": "NITI Aayog",
-            "title": "Policy Research & Analysis Intern",
-            "type": "government",
-            "sector": "Public Policy & Governance",
-            "skills": ["Research", "Policy Analysis", "Data Interpretation", "Report Writing", "Communication"],
-            "duration": "4 Months",
-            "location": "New Delhi",
-            "stipend": "₹20,000/month",
-            "description": "🏛️ Impact India's development! Research policy solutions and contribute to national development strategies."
-        },
-        {
-            "company": "Indian Railways",
-            "title": "Railway Operations & Technology Intern",
-            "type": "government",
-            "sector": "Transportation & Logistics",
-            "skills": ["Operations Management", "Logistics", "Engineering", "Project Management", "Data Analysis"],
-            "duration": "5 Months",
-            "location": "Multiple Cities",
-            "stipend": "₹18,000/month",
-            "description": "🚂 Power India's lifeline! Learn operations of world's largest railway network."
-        },
-        {
-            "company": "CSIR Labs",
-            "title": "Scientific Research Intern",
-            "type": "government",
-            "sector": "Scientific Research",
-            "skills": ["Research", "Data Analysis", "Laboratory Skills", "Scientific Writing", "Innovation"],
-            "duration": "6 Months",
-            "location": "Multiple CSIR Centers",
-            "stipend": "₹24,000/month",
-            "description": "🔬 Advance scientific knowledge! Work with India's premier scientific research organization."
-        },
-        {
-            "company": "Ministry of Electronics & IT",
-            "title": "Digital India Technology Intern",
-            "type": "government",
-            "sector": "Digital Governance",
-            "skills": ["Programming", "Digital Literacy", "Web Development", "Data Management", "Cybersecurity"],
-            "duration": "4 Months",
-            "location": "New Delhi/Pune",
-            "stipend": "₹21,000/month",
-            "description": "💻 Build Digital India! Contribute to nation's digital transformation and e-governance initiatives."
-        },
-        {
-            "company": "BARC",
-            "title": "Nuclear Technology Research Intern",
-            "type": "government",
-            "sector": "Nuclear Research",
-            "skills": ["Engineering", "Research", "Data Analysis", "Safety Protocols", "Technical Documentation"],
-            "duration": "5 Months",
-            "location": "Mumbai/Kalpakkam",
-            "stipend": "₹26,000/month",
-            "description": "⚛️ Power India's future! Work on nuclear technology and contribute to clean energy research."
-        },
-        
-        # PRIVATE-BASED INTERNSHIPS (8 options - high quality with competitive stipends)
-        {
-            "company": "TCS (Tata Consultancy Services)",
-            "title": "Software Development Intern",
-            "type": "private-based",
-            "sector": "IT Services",
-            "skills": ["Java", "Python", "Programming", "Problem Solving", "Communication"],
-            "duration": "3 Months",
-            "location": "Multiple Cities",
-            "stipend": "₹30,000/month",
-            "description": "💼 Industry leader experience! Work on enterprise software projects with India's largest IT company."
-        },
-        {
-            "company": "Infosys",
-            "title": "Digital Innovation Intern",
-            "type": "private-based",
-            "sector": "IT Consulting",
-            "skills": ["Digital Technologies", "Innovation", "Cloud Computing", "Problem Solving", "Teamwork"],
-            "duration": "3 Months",
-            "location": "Bangalore/Pune",
-            "stipend": "₹28,000/month",
-            "description": "🌟 Innovation at scale! Work on cutting-edge digital transformation projects with global impact."
-        },
-        {
-            "company": "Wipro",
-            "title": "Technology Solutions Intern",
-            "type": "private-based",
-            "sector": "IT Services",
-            "skills": ["Cloud Computing", "DevOps", "Programming", "Agile", "Learning Agility"],
-            "duration": "4 Months",
-            "location": "Pune/Bangalore",
-            "stipend": "₹32,000/month",
-            "description": "☁️ Future-ready skills! Gain hands-on experience with cloud technologies and modern development practices."
-        },
-        {
-            "company": "Microsoft India",
-            "title": "Technology Trainee",
-            "type": "private-based",
-            "sector": "Technology",
-            "skills": ["Programming", "AI/ML", "Cloud Platforms", "Data Science", "Innovation"],
-            "duration": "3 Months",
-            "location": "Hyderabad/Bangalore",
-            "stipend": "₹40,000/month",
-            "description": "🚀 Global technology experience! Work with cutting-edge Microsoft technologies and AI platforms."
-        },
-        {
-            "company": "Google India",
-            "title": "Software Engineering Intern",
-            "type": "private-based",
-            "sector": "Technology",
-            "skills": ["Programming", "Algorithms", "Data Structures", "Problem Solving", "Software Design"],
-            "duration": "4 Months",
-            "location": "Bangalore/Gurgaon",
-            "stipend": "₹50,000/month",
-            "description": "🌟 Dream opportunity! Work with world-class engineers on products used by billions."
-        },
-        {
-            "company": "Amazon India",
-            "title": "SDE Intern",
-            "type": "private-based",
-            "sector": "E-commerce Technology",
-            "skills": ["Programming", "System Design", "AWS", "Data Structures", "Problem Solving"],
-            "duration": "3 Months",
-            "location": "Bangalore/Hyderabad",
-            "stipend": "₹45,000/month",
-            "description": "📦 Scale at Amazon! Work on systems handling millions of customers and learn cloud technologies."
-        },
-        {
-            "company": "HDFC Bank",
-            "title": "Banking Technology Intern",
-            "type": "private-based",
-            "sector": "Financial Services",
-            "skills": ["Financial Technology", "Data Analysis", "Banking Operations", "Communication", "Excel"],
-            "duration": "3 Months",
-            "location": "Mumbai/Pune",
-            "stipend": "₹25,000/month",
-            "description": "🏦 FinTech innovation! Experience digital banking transformation with India's leading private bank."
-        },
-        {
-            "company": "Accenture",
-            "title": "Technology Consulting Intern",
-            "type": "private-based",
-            "sector": "IT Consulting",
-            "skills": ["Business Analysis", "Technology Consulting", "Communication", "Problem Solving", "Project Management"],
-            "duration": "4 Months",
-            "location": "Multiple Cities",
-            "stipend": "₹27,000/month",
-            "description": "💡 Consulting excellence! Work with global clients on technology transformation projects."
-        }
-    ]
-    
     # Return balanced top 5 with government priority
-    return sort_recommendations_by_match(all_recommendations, user)
+    return sort_recommendations_by_match(DEFAULT_RECOMMENDATIONS, user)
+
+def local_profile_memoize(ttl, maxsize=1024):
+    """In-process tier in front of a Redis-memoized recommendation function
+    
+    A user reloading recommendations on a warm instance gets a dict hit
+    instead of a Redis round trip. Keys are content-addressed by the
+    recommendation profile fields, so a profile change simply lands on a new
+    entry. Exceptions are not cached.
+    """
+    def decorator(func):
+        cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        lock = threading.Lock()
+        
+        @functools.wraps(func)
+        def wrapper(user):
+            user = user or {}
+            fingerprint = "|".join(str(user.get(field) or '') for field in RECOMMENDATION_PROFILE_FIELDS)
+            key = hashlib.blake2b(fingerprint.encode(), digest_size=16).digest()
+            with lock:
+                result = cache.get(key)
+            if result is None:
+                result = func(user)
+                with lock:
+                    cache[key] = result
+            return result
+        return wrapper
+    return decorator
+
+# get_enhanced_default_recommendations, memoized per process by profile fingerprint
+get_enhanced_default_recommendations_cached = local_profile_memoize(ttl=600)(get_enhanced_default_recommendations)
+
+@local_profile_memoize(ttl=600)
+@redis_memoize(ttl=RECOMMENDATION_CACHE_TTL, key=recommendation_cache_key("recs:ai"))
+def fetch_ai_recommendations(user):
+    """Ask Gemini for recommendations; raises if the response can't be parsed"""
+    # Shorter, more focused prompt for faster response
+    prompt = f"""
+    Generate 6 internship recommendations for:
+    - Skills: {user.get('skills', 'General')}
+    - Interest: {user.get('area_of_interest', 'IT')}
+    - Education: {user.get('qualification', 'Graduate')}
+    
+    IMPORTANT: Include more government internships (ISRO, DRDO, NITI Aayog, etc.)
+    
+    JSON format: [{{"company":"Name","title":"Position","type":"government|private-based","sector":"Sector","skills":["skill1","skill2"],"duration":"X Months","location":"City","stipend":"₹X/month","description":"Brief desc"}}]
+    """
+    
+    response = model.generate_content(
+        prompt,
+        generation_config=RECOMMENDATION_GENERATION_CONFIG
+    )
+    
+    recommendations_text = response.text.strip()
+    start_idx = recommendations_text.find('[')
+    end_idx = recommendations_text.rfind(']')
+    
+    if start_idx != -1 and end_idx > start_idx:
+        recommendations = orjson.loads(recommendations_text[start_idx:end_idx + 1])
+        return sort_recommendations_by_match(recommendations[:6], user)
+    else:
+        raise Exception("Could not parse AI response")
 
 def generate_recommendations_fast(user):
     """Fast AI recommendations with timeout and government preference"""
     try:
-        # Shorter, more focused prompt for faster response
-        prompt = f"""
-        Generate 6 internship recommendations for:
-        - Skills: {user.get('skills', 'General')}
-        - Interest: {user.get('area_of_interest', 'IT')}
-        - Education: {user.get('qualification', 'Graduate')}
-        
-        IMPORTANT: Include more government internships (ISRO, DRDO, NITI Aayog, etc.)
-        
-        JSON format: [{{"company":"Name","title":"Position","type":"government|private-based","sector":"Sector","skills":["skill1","skill2"],"duration":"X Months","location":"City","stipend":"₹X/month","description":"Brief desc"}}]
-        """
-        
-        response = model.generate_content(
-            prompt,
-            generation_config=genai.types.GenerationConfig(
-                max_output_tokens=800,
-                temperature=0.7,
-            )
-        )
-        
-        recommendations_text = response.text.strip()
-        start_idx = recommendations_text.find('[')
-        end_idx = recommendations_text.rfind(']') + 1
-        
-        if start_idx != -1 and end_idx != -1:
-            json_str = recommendations_text[start_idx:end_idx]
-            recommendations = json.loads(json_str)
-            return sort_recommendations_by_match(recommendations[:6], user)
-        else:
-            raise Exception("Could not parse AI response")
-            
+        return fetch_ai_recommendations(user)
     except Exception as e:
-        print(f"Fast AI recommendation error: {e}")
-        return get_enhanced_default_recommendations(user)
+        logger.error("Fast AI recommendation error: %s", e)
+        return get_enhanced_default_recommendations_cached(user)
+
+# Runs the (slow) recommendation call while the SSE generator sends heartbeats
+_recommendation_executor = ThreadPoolExecutor(max_workers=4)
 
 def get_default_recommendations(user):
     """Legacy function - calls enhanced version"""
     return get_enhanced_default_recommendations(user)
 
+# url_for walks the URL map on every call; the argument-less endpoints used for
+# redirects always build the same URL (per script root), so remember them
+_endpoint_urls = {}
+
+def endpoint_url(endpoint):
+    """url_for(endpoint) for endpoints without arguments, memoized per process"""
+    key = (request.script_root, endpoint)
+    url = _endpoint_urls.get(key)
+    if url is None:
+        url = _endpoint_urls[key] = url_for(endpoint)
+    return url
+
+@functools.lru_cache(maxsize=8)
+def signup_info_message(signup_url):
+    """Sign-up hint flashed after a login with an unknown email, built once per URL"""
+    return f'💡 Don\'t have an account? <a href="{signup_url}" class="alert-link text-decoration-none"><strong>Sign up here</strong></a> to get started!'
+
 @app.before_request
 def clear_stale_flash_messages():
     """Clear flash messages for non-authenticated users"""
@@ -668,17 +1436,51 @@ def clear_stale_flash_messages():
         if '_flashes' in session:
             session.pop('_flashes', None)
 
+def regenerate_session():
+    """Start a fresh, empty session under a new id
+    
+    Flask-Session keeps the pre-login session id otherwise, which would let
+    an attacker who planted that id ride the authenticated session. The old
+    Redis entry is deleted; signed-cookie sessions only need clearing.
+    """
+    sid = getattr(session, 'sid', None)
+    if sid is not None:
+        try:
+            redis_client.delete(app.session_interface.key_prefix + sid)
+        except Exception as e:
+            logger.warning("Redis session delete error: %s", e)
+        session.sid = str(uuid.uuid4())
+    session.clear()
+
+def login_required(view=None, *, api=False, message=None):
+    """Only let logged-in sessions through to the view
+    
+    Checks the session alone; views fetch the user row themselves only when
+    they need it. Pages redirect to the login page (flashing `message` if
+    given), API endpoints (api=True) answer 401 JSON instead.
+    """
+    if view is None:
+        return functools.partial(login_required, api=api, message=message)
+    
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not (session.get('logged_in') and session.get('user_id')):
+            if api:
+                return jsonify({'error': 'Not authenticated'}), 401
+            if message:
+                flash(message, 'error')
+            return redirect(endpoint_url('index'))
+        return view(*args, **kwargs)
+    return wrapper
+
 # Routes
 @app.route('/')
 def index():
     return render_template('login.html')
 
 @app.route('/home')
+@login_required(message='Please login to access the home page')
 def home():
-    if not session.get('logged_in'):
-        flash('Please login to access the home page', 'error')
-        return redirect(url_for('index'))
-    
     user_name = session.get('user_name', 'User')
     user_email = session.get('user_email', '')
     user_initials = session.get('user_initials', 'U')
@@ -695,8 +1497,9 @@ def login():
         password = request.form.get('password', '')
         remember = request.form.get('remember')
         
-        # Clear any existing flash messages
-        session.pop('_flashes', None)
+        # Clear any existing flash messages (checking first keeps a clean session unmodified)
+        if '_flashes' in session:
+            session.pop('_flashes')
         
         # Basic validation
         if not email or not password:
@@ -709,37 +1512,39 @@ def login():
             return render_template('login.html')
         
         # Verify user credentials
-        user = verify_user(email, password)
+        status, user = verify_user(email, password)
         
-        if user:
+        if status == "ok":
             # Login successful
-            try:
-                full_name = user['full_name'] if user['full_name'] and user['full_name'] != 'User' else get_user_display_name(None, user['email'])
-            except (KeyError, TypeError):
-                full_name = get_user_display_name(None, user['email'])
+            full_name = get_user_display_name(user.get('full_name'), user['email'])
+            
+            # A new session starts from the stored profile, not from whatever
+            # another instance may still have cached
+            invalidate_user_cache(user['id'])
             
-            # Set session data
+            # Set session data on a new session id; this also drops anything
+            # (e.g. a profile copy) left behind by a previous user of this browser
+            regenerate_session()
             session['user_id'] = user['id']
             session['user_name'] = full_name
             session['user_email'] = user['email']
             session['user_initials'] = get_user_initials(full_name)
             session['logged_in'] = True
             
-            update_last_login(user['id'])
+            run_in_background(update_last_login, user['id'])
             
             if remember:
                 session.permanent = True
-                app.permanent_session_lifetime = timedelta(days=30)
             
             flash(f'🎉 Welcome back, {full_name}!', 'success')
-            return redirect(url_for('home'))
+            return redirect(endpoint_url('home'))
         else:
-            # Login failed - check specific reason
-            if check_email_exists(email):
+            # Login failed - verify_user already told us why
+            if status == "bad_password":
                 flash('❌ Incorrect password. Please check your password and try again.', 'error')
             else:
                 flash('❌ No account found with this email address.', 'error')
-                flash(f'💡 Don\'t have an account? <a href="{url_for("signup")}" class="alert-link text-decoration-none"><strong>Sign up here</strong></a> to get started!', 'info')
+                flash(signup_info_message(endpoint_url('signup')), 'info')
             
             return render_template('login.html')
     
@@ -753,7 +1558,8 @@ def signup():
         password = request.form.get('password', '')
         confirm_password = request.form.get('confirm_password', '')
         
-        session.pop('_flashes', None)
+        if '_flashes' in session:
+            session.pop('_flashes')
         
         if not full_name or not email or not password or not confirm_password:
             flash('All fields are required', 'error')
@@ -784,7 +1590,7 @@ def signup():
         if success:
             # Enhanced success message
             flash(f'🎉 Welcome {full_name}! Your account has been created successfully. Please login to continue.', 'success')
-            return redirect(url_for('login'))
+            return redirect(endpoint_url('login'))
         else:
             flash(message, 'error')
             return render_template('signup.html')
@@ -795,35 +1601,18 @@ def signup():
 def logout():
     session.clear()
     flash('You have been logged out successfully', 'success')
-    return redirect(url_for('index'))
+    return redirect(endpoint_url('index'))
 
 @app.route('/profile', methods=['GET', 'POST'])
+@login_required
 def profile():
-    if not session.get('logged_in'):
-        return redirect(url_for('index'))
-    
     if request.method == 'POST':
         try:
-            form_data = {
-                'full_name': request.form.get('full_name'),
-                'father_name': request.form.get('father_name'),
-                'gender': request.form.get('gender'),
-                'phone': request.form.get('phone'),
-                'district': request.form.get('district'),
-                'address': request.form.get('address'),
-                'qualification': request.form.get('qualification'),
-                'qualification_marks': float(request.form.get('qualification_marks')) if request.form.get('qualification_marks') else None,
-                'course': request.form.get('course'),
-                'course_marks': float(request.form.get('course_marks')) if request.form.get('course_marks') else None,
-                'area_of_interest': request.form.get('area_of_interest'),
-                'skills': request.form.get('skills'),
-                'languages': request.form.get('languages'),
-                'experience': request.form.get('experience'),
-                'prior_internship': request.form.get('prior_internship'),
-                'otp_verified': True,
-                'registration_completed': True,
-                'profile_completed': True
-            }
+            form = request.form.to_dict()
+            form_data = {field: form.get(field) for field in PROFILE_FORM_FIELDS}
+            for field in PROFILE_MARKS_FIELDS:
+                form_data[field] = _f(form.get(field))
+            form_data.update(otp_verified=True, registration_completed=True, profile_completed=True)
             
             # Handle file uploads (simplified for Vercel serverless)
             file_paths = {}
@@ -831,28 +1620,30 @@ def profile():
             # Note: For production on Vercel, consider using cloud storage
             # like Supabase Storage, AWS S3, or Cloudinary for file uploads
             
-            if update_user_profile(session.get('user_id'), {**form_data, **file_paths}):
-                if form_data['full_name']:
-                    session['user_name'] = form_data['full_name']
-                    session['user_initials'] = get_user_initials(form_data['full_name'])
+            updated = update_user_profile(session.get('user_id'), {**form_data, **file_paths})
+            if updated:
+                g.pop('users', None)
+                session['profile'] = project_columns(updated, USER_RECOMMENDATION_COLUMNS)
+                # Initials are derived from the name, so only recompute them when it changes
+                if updated.get('full_name') and updated['full_name'] != session.get('user_name'):
+                    session['user_name'] = updated['full_name']
+                    session['user_initials'] = get_user_initials(updated['full_name'])
                 
-                session.pop('_flashes', None)
                 flash('Profile updated successfully!', 'success')
             else:
                 flash('Error updating profile. Please try again.', 'error')
             
-            return redirect(url_for('profile'))
+            return redirect(endpoint_url('profile'))
             
-        except Exception as e:
-            print(f"Profile update error: {e}")
-            session.pop('_flashes', None)
+        except Exception:
+            logger.exception("Profile update error")
             flash('Error updating profile. Please try again.', 'error')
-            return redirect(url_for('profile'))
+            return redirect(endpoint_url('profile'))
     
-    user = get_user_by_id(session.get('user_id'))
+    user = current_user()
     
     if not user:
-        return redirect(url_for('index'))
+        return redirect(endpoint_url('index'))
     
     return render_template('profile.html', 
                          user=user,
@@ -862,61 +1653,124 @@ def profile():
 
 # ENHANCED: Recommendations route with balanced top 5 results and government preference
 @app.route('/recommendations')
+@login_required
 def recommendations():
-    if not session.get('logged_in'):
-        return redirect(url_for('index'))
-    
-    user = get_user_by_id(session.get('user_id'))
+    user = recommendation_profile()
     if not user:
-        return redirect(url_for('index'))
+        return redirect(endpoint_url('index'))
     
     # Check if profile is completed
     if not user.get('profile_completed'):
         flash('Please complete your profile first to get personalized recommendations.', 'warning')
-        return redirect(url_for('profile'))
+        return redirect(endpoint_url('profile'))
     
     # Get top 5 balanced recommendations with government priority
-    top_recommendations = get_enhanced_default_recommendations(user)
+    top_recommendations = get_enhanced_default_recommendations_cached(user)
     
-    return render_template('recommendations.html', 
+    response = make_response(render_template('recommendations.html', 
                          user=user,
                          recommendations=top_recommendations,
                          user_name=session.get('user_name', 'User'),
                          user_email=session.get('user_email', ''),
-                         user_initials=session.get('user_initials', 'U'))
+                         user_initials=session.get('user_initials', 'U')))
+    # Per-user page: never in a shared cache, and the browser revalidates on
+    # every load. The ETag covers the rendered page, so a profile save or a
+    # different user on this browser changes it, while an unchanged page
+    # comes back as a bodiless 304.
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    response.add_etag()
+    return response.make_conditional(request)
 
 # ENHANCED: AI recommendations with skill matching and government preference
 @app.route('/api/generate-ai-recommendations')
+@login_required(api=True)
 def generate_ai_recommendations():
-    """AJAX endpoint to generate AI recommendations sorted by match score with government preference"""
-    if not session.get('logged_in'):
-        return jsonify({'error': 'Not authenticated'}), 401
+    """Server-sent event stream of AI recommendations sorted by match score with government preference
     
-    user = get_user_by_id(session.get('user_id'))
+    Gemini can take a while, so a heartbeat comment goes out every
+    SSE_HEARTBEAT_INTERVAL seconds to keep proxies from dropping the
+    connection. Each recommendation is then sent as its own `data:` frame,
+    followed by a final `done` event.
+    """
+    user = recommendation_profile()
     if not user:
         return jsonify({'error': 'User not found'}), 404
     
+    def generate():
+        future = _recommendation_executor.submit(generate_recommendations_fast, user)
+        while True:
+            try:
+                recommendations = future.result(timeout=SSE_HEARTBEAT_INTERVAL)
+                break
+            except FutureTimeoutError:
+                yield b": heartbeat\n\n"
+            except Exception:
+                logger.exception("AI recommendations error")
+                # Fallback to enhanced default recommendations
+                recommendations = get_enhanced_default_recommendations_cached(user)
+                break
+        
+        for recommendation in recommendations:
+            yield b"data: " + orjson.dumps(recommendation) + b"\n\n"
+        yield b"event: done\ndata: {}\n\n"
+    
+    # The stream can stay open for a while; don't hold a pooled connection for it
+    release_db_connection()
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+@app.route('/upload/<category>', methods=['POST'])
+@login_required(api=True)
+def upload_document(category):
+    """Stream one uploaded document straight to disk
+    
+    Bypasses request.files so Werkzeug never buffers or re-parses the
+    multipart body; chunks go from the socket into the target file.
+    """
+    if category not in UPLOAD_CATEGORIES:
+        return jsonify({'error': 'Unknown upload category'}), 404
+    
+    # The client's filename is only known once parsing has started, so stream
+    # into a temporary name and move it into place afterwards
+    upload_dir = os.path.join(UPLOAD_FOLDER, category)
+    temp_path = os.path.join(upload_dir, f".upload-{uuid.uuid4().hex}")
+    target = FileTarget(temp_path)
+    
     try:
-        # Try to generate AI recommendations
-        ai_recommendations = generate_recommendations_fast(user)
+        parser = StreamingFormDataParser(headers=request.headers)
+        parser.register('file', target)
+        while chunk := request.stream.read(UPLOAD_CHUNK_SIZE):
+            parser.data_received(chunk)
         
-        # Sort AI recommendations by skill match with government preference
-        sorted_recommendations = sort_recommendations_by_match(ai_recommendations, user)
+        if not target.multipart_filename:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return jsonify({'error': 'No file provided'}), 400
         
-        return jsonify({
-            'success': True,
-            'recommendations': sorted_recommendations
-        })
-    except Exception as e:
-        print(f"AI recommendations error: {e}")
-        # Fallback to enhanced default recommendations
-        fallback_recommendations = get_enhanced_default_recommendations(user)
-        return jsonify({
-            'success': True,
-            'recommendations': fallback_recommendations
-        })
+        filename = secure_filename(target.multipart_filename)
+        if not filename or not allowed_file(filename):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return jsonify({'error': 'File type not allowed'}), 400
+        
+        saved_name = f"{session.get('user_id')}_{filename}"
+        os.replace(temp_path, os.path.join(upload_dir, saved_name))
+        return jsonify({'success': True, 'filename': saved_name})
+    
+    except HTTPException:
+        # e.g. RequestEntityTooLarge past MAX_CONTENT_LENGTH - let Flask answer 413
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    except Exception:
+        logger.exception("Upload error")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return jsonify({'error': 'Upload failed'}), 500
 
 @app.route('/chat', methods=['POST'])
+@login_required(api=True)
 def chat():
     try:
         data = request.get_json()
@@ -926,9 +1780,8 @@ def chat():
             return jsonify({'error': 'No message provided'}), 400
         
         user_name = session.get('user_name', 'User')
-        user_email = session.get('user_email', '')
         
-        bot_response = get_gemini_response(user_message, user_name, user_email)
+        bot_response = get_gemini_response(user_message, user_name)
         log_conversation(user_message, bot_response, session.get('user_id'))
         
         return jsonify({
@@ -936,17 +1789,54 @@ def chat():
             'success': True
         })
     
-    except Exception as e:
-        print(f"Chat error: {e}")
+    except Exception:
+        logger.exception("Chat error")
         return jsonify({
             'reply': '⚠️ I apologize, but I encountered an error. Please try again or contact support.',
             'success': False
         }), 500
 
+@app.route('/chat/stream', methods=['POST'])
+@login_required(api=True)
+def chat_stream():
+    """Chat endpoint that streams the reply as server-sent events while Gemini generates it
+    
+    Each piece of text is a `data: {"chunk": ...}` frame; a final
+    `data: {"done": true}` frame marks the end of the answer.
+    """
+    data = request.get_json(silent=True) or {}
+    user_message = data.get('message', '').strip()
+    
+    if not user_message:
+        return jsonify({'error': 'No message provided'}), 400
+    
+    user_name = session.get('user_name', 'User')
+    user_id = session.get('user_id')
+    
+    def generate():
+        parts = []
+        try:
+            for text in stream_gemini_response(user_message, user_name):
+                parts.append(text)
+                yield b"data: " + orjson.dumps({'chunk': text}) + b"\n\n"
+            yield b'data: {"done":true}\n\n'
+        finally:
+            # Also runs if the client disconnects mid-answer
+            if parts:
+                log_conversation(user_message, ''.join(parts), user_id)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
 @app.route('/clear-session')
 def clear_session():
     session.clear()
-    return redirect(url_for('index'))
+    return redirect(endpoint_url('index'))
+
+DEBUG_USERS_LIMIT = 500
+DEBUG_USERS_TEMPLATE = """<h2>Registered Users (Supabase):</h2><ul>
+{%- for user in users %}<li>ID: {{ user.id }}, Name: {{ user.full_name }}, Email: {{ user.email }}, Created: {{ user.created_at }}</li>{% endfor -%}
+</ul><br><a href='/clear-session'>Clear Session</a> | <a href='/'>Home</a>"""
 
 @app.route('/debug-users')
 def debug_users():
@@ -955,31 +1845,37 @@ def debug_users():
         return "Not available in production"
     
     try:
+        supabase = get_supabase()
         if not supabase:
             return "Database connection not available"
             
-        response = supabase.table('users').select('id, full_name, email, created_at').execute()
-        users = response.data
-        
-        output = "<h2>Registered Users (Supabase):</h2><ul>"
-        for user in users:
-            output += f"<li>ID: {user['id']}, Name: {user['full_name']}, Email: {user['email']}, Created: {user['created_at']}</li>"
-        output += "</ul>"
-        output += "<br><a href='/clear-session'>Clear Session</a> | <a href='/'>Home</a>"
+        response = supabase.table('users').select('id, full_name, email, created_at').limit(DEBUG_USERS_LIMIT).execute()
         
-        return output
+        return render_template_string(DEBUG_USERS_TEMPLATE, users=response.data)
     except Exception as e:
         return f"Error fetching users: {e}"
 
 # Health check endpoint for Vercel
+# (second, ISO string) of the last formatted timestamp - health probes arrive
+# many times a second, so most of them reuse the string
+_iso_now_cache = (0, '')
+
+def _iso_now():
+    """Current UTC time as ISO-8601, at one-second resolution"""
+    global _iso_now_cache
+    now = int(time.time())
+    if now != _iso_now_cache[0]:
+        _iso_now_cache = (now, datetime.fromtimestamp(now, timezone.utc).isoformat())
+    return _iso_now_cache[1]
+
 @app.route('/health')
 def health_check():
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now(timezone.utc).isoformat()})
+    return jsonify({'status': 'healthy', 'timestamp': _iso_now()})
 
 # Vercel serverless function handler
 if __name__ == '__main__':
-    print("🚀 Starting PM Internship App with Balanced Government Priority Recommendations...")
-    print(f"✅ Supabase URL: {os.getenv('SUPABASE_URL')}")
+    logger.info("🚀 Starting PM Internship App with Balanced Government Priority Recommendations...")
+    logger.info("✅ Supabase URL: %s", os.getenv('SUPABASE_URL'))
     app.run(debug=False)  # Set to False for production
 
 # For Vercel deployment
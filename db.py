@@ -0,0 +1,65 @@
+"""Direct Postgres access for the hot user-table queries.
+
+PostgREST opens a fresh HTTPS session per call, so the busiest lookups go
+through a small SQLAlchemy pool against the Supabase session-mode pooler
+(port 5432) instead. app.py calls init_engine() with SUPABASE_DB_URL; when
+it is missing `engine` stays None and app.py falls back to the Supabase
+REST client.
+"""
+import logging
+from sqlalchemy import create_engine, text
+
+logger = logging.getLogger(__name__)
+
+engine = None
+
+def init_engine(url):
+    """Create the pooled engine used by the helpers below (no-op without a URL)"""
+    global engine
+    if not url:
+        return None
+    try:
+        engine = create_engine(
+            url,
+            pool_size=3,
+            max_overflow=2,
+            pool_pre_ping=True,
+            pool_recycle=1800,
+            pool_timeout=30,
+        )
+        logger.info("✅ Postgres connection pool configured!")
+    except Exception as e:
+        logger.error("❌ Postgres pool configuration error: %s", e)
+        engine = None
+    return engine
+
+def fetch_one(sql, conn=None, **params):
+    """Run a SELECT and return the first row as a dict (or None)
+
+    Uses `conn` when given (e.g. a connection held for the whole request),
+    otherwise checks one out of the pool for just this query.
+    """
+    if conn is not None:
+        row = conn.execute(text(sql), params).mappings().first()
+        return dict(row) if row else None
+    with engine.connect() as conn:
+        row = conn.execute(text(sql), params).mappings().first()
+        return dict(row) if row else None
+
+def execute(sql, **params):
+    """Run a write statement in its own transaction and return the rowcount"""
+    with engine.begin() as conn:
+        return conn.execute(text(sql), params).rowcount
+
+def execute_many(sql, rows):
+    """Run one write statement for every params dict in rows (executemany) in a
+    single transaction and return the rowcount"""
+    with engine.begin() as conn:
+        return conn.execute(text(sql), rows).rowcount
+
+def execute_returning(sql, **params):
+    """Run a write statement that returns rows (RETURNING / set-returning
+    function) in its own transaction and return the first row as a dict"""
+    with engine.begin() as conn:
+        row = conn.execute(text(sql), params).mappings().first()
+        return dict(row) if row else None
@@ -0,0 +1,29 @@
+-- Apply a partial profile update in a single call.
+-- Keys that are missing, null or empty strings in the patch keep the stored
+-- value, so the app can send the raw form without filtering it first.
+create or replace function public.update_user_profile_jsonb(uid bigint, patch jsonb)
+returns setof public.users
+language sql
+as $$
+    update public.users set
+        full_name = coalesce(nullif(patch->>'full_name', ''), full_name),
+        father_name = coalesce(nullif(patch->>'father_name', ''), father_name),
+        gender = coalesce(nullif(patch->>'gender', ''), gender),
+        phone = coalesce(nullif(patch->>'phone', ''), phone),
+        district = coalesce(nullif(patch->>'district', ''), district),
+        address = coalesce(nullif(patch->>'address', ''), address),
+        qualification = coalesce(nullif(patch->>'qualification', ''), qualification),
+        qualification_marks = coalesce((patch->>'qualification_marks')::numeric, qualification_marks),
+        course = coalesce(nullif(patch->>'course', ''), course),
+        course_marks = coalesce((patch->>'course_marks')::numeric, course_marks),
+        area_of_interest = coalesce(nullif(patch->>'area_of_interest', ''), area_of_interest),
+        skills = coalesce(nullif(patch->>'skills', ''), skills),
+        languages = coalesce(nullif(patch->>'languages', ''), languages),
+        experience = coalesce(nullif(patch->>'experience', ''), experience),
+        prior_internship = coalesce(nullif(patch->>'prior_internship', ''), prior_internship),
+        otp_verified = coalesce((patch->>'otp_verified')::boolean, otp_verified),
+        registration_completed = coalesce((patch->>'registration_completed')::boolean, registration_completed),
+        profile_completed = coalesce((patch->>'profile_completed')::boolean, profile_completed)
+    where id = uid
+    returning *;
+$$;
@@ -0,0 +1,3 @@
+-- create_user inserts with ON CONFLICT (email) DO NOTHING, which needs a
+-- unique index on users.email to infer the conflict target.
+create unique index if not exists users_email_key on public.users (email);
@@ -0,0 +1,4 @@
+-- Emails are unique regardless of case. The app lowercases addresses before
+-- writing, but this also covers rows written by other clients; create_user
+-- reports the resulting 23505 unique_violation as "Email already registered".
+create unique index if not exists users_email_lower_idx on public.users (lower(email));
@@ -0,0 +1,18 @@
+-- Track when a user row last changed. The timestamp is set by the database
+-- (default on insert, trigger on update), so the app never sends it.
+alter table public.users add column if not exists updated_at timestamptz not null default now();
+
+create or replace function public.set_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+drop trigger if exists users_set_updated_at on public.users;
+create trigger users_set_updated_at
+    before update on public.users
+    for each row execute function public.set_updated_at();
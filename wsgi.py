@@ -0,0 +1,31 @@
+"""Gunicorn entry point for long-running hosts (Vercel imports app.py directly).
+
+Run with gevent workers so a worker keeps serving other requests while one
+waits on Supabase or Gemini:
+
+    gunicorn -k gevent -w 2 --worker-connections 1000 wsgi:app
+
+With CELERY_BROKER_URL set, background writes are queued instead of run
+in-process, so the Procfile's worker process must be running as well.
+
+Patching has to happen before anything else imports socket/ssl/threading,
+so this module does it first and only then imports the app.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import grpc.experimental.gevent as grpc_gevent  # noqa: E402
+
+# google-generativeai talks gRPC, whose C core does its own I/O that
+# monkey-patching can't reach; run it on the gevent hub so a Gemini call
+# doesn't stall every other greenlet on the worker
+grpc_gevent.init_gevent()
+
+from psycogreen.gevent import patch_psycopg  # noqa: E402
+
+# psycopg2 is a C extension that monkey-patching can't reach; make its
+# waits cooperative so pooled queries yield to other greenlets
+patch_psycopg()
+
+from app import app  # noqa: E402,F401